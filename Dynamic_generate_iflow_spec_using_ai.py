@@ -1,17 +1,27 @@
 import json
 import urllib3
-import xml.etree.ElementTree as ET
+from lxml import etree as ET
 from docx import Document
-from docx.shared import RGBColor, Inches
+from docx.shared import RGBColor, Inches, Emu
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 from datetime import datetime
 import requests
-import matplotlib.pyplot as plt
-import networkx as nx
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime
 import os
-
-from docx.shared import Pt
+import subprocess
+import re
+from xml.sax.saxutils import escape
+import time
+import hashlib
+import sqlite3
+import functools
+from contextlib import closing
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
 
 
 # --- Load config ---
@@ -21,15 +31,55 @@ GEMINI_API_URL = config["gemini_api_url"]
 GEMINI_API_KEY = config["gemini_api_key"]
 XML_PATH = config["source_xml_path"]
 GROOVY_SCRIPTS_FOLDER = config.get("groovy_scripts_folder", None)
+# Summaries are cached across runs unless gemini_cache_path is set to null or ""
+GEMINI_CACHE_PATH = config.get(
+    "gemini_cache_path",
+    os.path.join(os.path.expanduser("~"), ".cache", "iflow_gemini", "gemini_cache.sqlite3"),
+)
+# Without an endpoint and key no prompts are built and every summary is empty
+GEMINI_ENABLED = bool(GEMINI_API_URL and GEMINI_API_KEY)
+# false sends every section as its own (concurrent) request instead of one batch
+GEMINI_BATCH_SECTIONS = config.get("gemini_batch_sections", True)
 
 iflow_name = os.path.splitext(os.path.basename(XML_PATH))[0]
 
+# --- Compiled XPath queries ---
+BPMN = "http://www.omg.org/spec/BPMN/20100524/MODEL"
+BPMN_DI = "http://www.omg.org/spec/BPMN/20100524/DI"
+IFL = "http:///com.sap.ifl.model/Ifl.xsd"
+NS = {"bpmn2": BPMN, "ifl": IFL}
+_XP_EXT = ET.XPath("bpmn2:extensionElements", namespaces=NS)
+_XP_PROP = ET.XPath("ifl:property", namespaces=NS)
+_XP_CHILDREN = ET.XPath("*")
+TAG_COLLABORATION = f"{{{BPMN}}}collaboration"
+TAG_PROCESS = f"{{{BPMN}}}process"
+TAG_MSGFLOW = f"{{{BPMN}}}messageFlow"
+TAG_SEQFLOW = f"{{{BPMN}}}sequenceFlow"
+TAG_CALL_ACTIVITY = f"{{{BPMN}}}callActivity"
+TAG_SUBPROCESS = f"{{{BPMN}}}subProcess"
+TAG_IFL_PROPERTY = f"{{{IFL}}}property"
+TAG_BPMN_DIAGRAM = f"{{{BPMN_DI}}}BPMNDiagram"
+
+
+# --- HTTP Session ---
+# One keep-alive session for every HTTPS request, so the Gemini calls (which run
+# concurrently) reuse pooled connections instead of a new TLS handshake each time
+_SESSION = requests.Session()
+_SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=20,
+        max_retries=Retry(total=2, backoff_factor=0.5),
+    ),
+)
+
 
 # --- Gemini API Call ---
-def call_gemini(prompt):
+def _post_gemini(prompt):
     headers = {"Content-Type": "application/json", "X-goog-api-key": GEMINI_API_KEY}
     data = {"contents": [{"parts": [{"text": prompt}]}]}
-    response = requests.post(GEMINI_API_URL, headers=headers, json=data)
+    response = _SESSION.post(GEMINI_API_URL, headers=headers, json=data)
     if response.status_code == 200:
         result = response.json()
         return result["candidates"][0]["content"]["parts"][0]["text"]
@@ -38,42 +88,174 @@ def call_gemini(prompt):
         return ""
 
 
+# --- Gemini Response Cache ---
+def _open_gemini_cache():
+    cache_dir = os.path.dirname(GEMINI_CACHE_PATH)
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+    conn = sqlite3.connect(GEMINI_CACHE_PATH)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS cache "
+        "(prompt_sha TEXT PRIMARY KEY, response TEXT, ts INTEGER)"
+    )
+    return conn
+
+
+class _GeminiCallFailed(Exception):
+    pass
+
+
+# Identical prompts within a run are served by lru_cache; across runs by the
+# sqlite store at GEMINI_CACHE_PATH, keyed on a hash of the full prompt (which
+# already contains the section name, instructions and content).
+# Failed calls raise here, so lru_cache never memoizes them and the sqlite store
+# never persists them; call_gemini turns the failure into "".
+@functools.lru_cache(maxsize=512)
+def _cached_gemini(prompt):
+    if not GEMINI_CACHE_PATH:
+        text = _post_gemini(prompt)
+        if not text:
+            raise _GeminiCallFailed
+        return text
+    key = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    with closing(_open_gemini_cache()) as conn:
+        row = conn.execute(
+            "SELECT response FROM cache WHERE prompt_sha = ?", (key,)
+        ).fetchone()
+    if row:
+        return row[0]
+    text = _post_gemini(prompt)
+    if not text:
+        raise _GeminiCallFailed
+    with closing(_open_gemini_cache()) as conn, conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO cache VALUES (?, ?, ?)",
+            (key, text, int(time.time())),
+        )
+    return text
+
+
+def call_gemini(prompt):
+    try:
+        return _cached_gemini(prompt)
+    except _GeminiCallFailed:
+        return ""
+
+
 # --- Utility Functions ---
-def format_key(key):
-    import re
+_CAMEL_SPLIT = re.compile(r"(?<!^)(?=[A-Z])")
+
 
+# Keys repeat across every message flow and component, so memoize
+@functools.lru_cache(maxsize=4096)
+def format_key(key):
     key = key.replace("_", " ")
-    key = re.sub(r"(?<!^)(?=[A-Z])", " ", key)
+    key = _CAMEL_SPLIT.sub(" ", key)
     return key.title()
 
 
-def add_heading(doc, text, level=1):
-    doc.add_heading(text, level=level)
+# --- Document Body Builders ---
+# The document body is accumulated as raw w:p / w:tbl XML strings and attached
+# to the Document with a single append_body_xml() call before saving.
+def _run_xml(text, bold=False, italic=False, font_size=None, color=None, font_name=None):
+    rpr = ""
+    if font_name:
+        rpr += f'<w:rFonts w:ascii="{font_name}" w:hAnsi="{font_name}"/>'
+    if bold:
+        rpr += "<w:b/>"
+    if italic:
+        rpr += "<w:i/>"
+    if color:
+        rpr += f'<w:color w:val="{color}"/>'
+    if font_size:
+        rpr += f'<w:sz w:val="{int(font_size * 2)}"/>'
+    # Same as python-docx add_run(): newlines become breaks and tabs become tabs
+    content = []
+    for n, line in enumerate(text.split("\n")):
+        if n:
+            content.append("<w:br/>")
+        for t, chunk in enumerate(line.split("\t")):
+            if t:
+                content.append("<w:tab/>")
+            if chunk:
+                content.append(f'<w:t xml:space="preserve">{escape(chunk)}</w:t>')
+    rpr = f"<w:rPr>{rpr}</w:rPr>" if rpr else ""
+    return f"<w:r>{rpr}{''.join(content)}</w:r>"
+
+
+def _p_xml(text, style=None, center=False, **run_props):
+    ppr = ""
+    if style:
+        ppr += f'<w:pStyle w:val="{style}"/>'
+    if center:
+        ppr += '<w:jc w:val="center"/>'
+    ppr = f"<w:pPr>{ppr}</w:pPr>" if ppr else ""
+    return f"<w:p>{ppr}{_run_xml(text, **run_props)}</w:p>"
 
 
-def add_paragraph(doc, text, bold=False, italic=False, center=False, font_size=12):
-    p = doc.add_paragraph()
-    if center:
-        p.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    run = p.add_run(text)
-    run.bold = bold
-    run.italic = italic
-    run.font.size = Pt(font_size)
-
-
-def add_colored_table(doc, data, column_names, header_color=RGBColor(0, 51, 102)):
-    table = doc.add_table(rows=1, cols=len(column_names))
-    table.style = "Table Grid"
-    hdr_cells = table.rows[0].cells
-    for i, name in enumerate(column_names):
-        run = hdr_cells[i].paragraphs[0].add_run(name)
-        run.bold = True
-        run.font.color.rgb = header_color
+def _tbl_xml(data, column_names, header_color, width):
+    cols = len(column_names)
+    col_width = Emu(width // cols).twips
+    tc_pr = f'<w:tcPr><w:tcW w:type="dxa" w:w="{col_width}"/></w:tcPr>'
+
+    def row_xml(cells):
+        return "<w:tr>" + "".join(f"<w:tc>{tc_pr}{cell}</w:tc>" for cell in cells) + "</w:tr>"
+
+    rows = [row_xml(_p_xml(name, bold=True, color=header_color) for name in column_names)]
     for row in data:
-        row_cells = table.add_row().cells
-        for i, item in enumerate(row):
-            row_cells[i].text = str(item)
-    return table
+        cells = [_p_xml(str(item)) for item in row]
+        cells += ["<w:p/>"] * (cols - len(cells))
+        rows.append(row_xml(cells))
+    return (
+        "<w:tbl><w:tblPr>"
+        '<w:tblStyle w:val="TableGrid"/><w:tblW w:type="auto" w:w="0"/>'
+        '<w:tblLook w:firstColumn="1" w:firstRow="1" w:lastColumn="0" '
+        'w:lastRow="0" w:noHBand="0" w:noVBand="1" w:val="04A0"/>'
+        "</w:tblPr><w:tblGrid>"
+        + f'<w:gridCol w:w="{col_width}"/>' * cols
+        + "</w:tblGrid>"
+        + "".join(rows)
+        + "</w:tbl>"
+    )
+
+
+def add_heading(body, text, level=1):
+    body.append(_p_xml(text, style=f"Heading{level}"))
+
+
+def add_paragraph(body, text, bold=False, italic=False, center=False, font_size=12):
+    body.append(
+        _p_xml(text, center=center, bold=bold, italic=italic, font_size=font_size)
+    )
+
+
+def add_page_break(body):
+    body.append('<w:p><w:r><w:br w:type="page"/></w:r></w:p>')
+
+
+def add_picture(body, doc, image_path, width):
+    # The image part still has to be registered on the document package
+    inline = doc.part.new_pic_inline(image_path, width, None)
+    drawing = ET.tostring(inline, encoding="unicode")
+    body.append(f"<w:p><w:r><w:drawing>{drawing}</w:drawing></w:r></w:p>")
+
+
+def add_colored_table(
+    body, data, column_names, header_color=RGBColor(0, 51, 102), width=Inches(6)
+):
+    body.append(_tbl_xml(data, column_names, str(header_color), width))
+
+
+def append_body_xml(doc, body):
+    fragment = parse_xml(f"<w:body {nsdecls('w')}>{''.join(body)}</w:body>")
+    doc_body = doc.element.body
+    sect_pr = doc_body.sectPr
+    for child in list(fragment):
+        # Body content must stay ahead of the trailing section properties
+        if sect_pr is not None:
+            sect_pr.addprevious(child)
+        else:
+            doc_body.append(child)
 
 
 def add_header_footer(doc, page_name, author, version):
@@ -90,371 +272,416 @@ def add_header_footer(doc, page_name, author, version):
 
 
 # --- XML Extraction Functions ---
-def extract_section_xml(root, xpath):
-    elems = root.findall(xpath)
-    return "\n".join([ET.tostring(e, encoding="unicode") for e in elems])
+def property_key_value(prop):
+    # One pass over the <key>/<value> children instead of two findtext() scans
+    key = value = None
+    for child in prop:
+        if child.tag == "key":
+            key = child.text
+        elif child.tag == "value":
+            value = child.text
+    return key, value
 
 
 def extract_properties_from_extension(elem):
     props = []
-    for ext in elem.findall(".//{http:///com.sap.ifl.model/Ifl.xsd}property"):
-        key = ext.findtext("key")
-        value = ext.findtext("value")
+    for ext in elem.iter(TAG_IFL_PROPERTY):
+        key, value = property_key_value(ext)
         if key:
             props.append([format_key(key), value if value else ""])
     return props
 
 
-def extract_security(root):
-    for collab in root.findall(
-        ".//{http://www.omg.org/spec/BPMN/20100524/MODEL}collaboration"
-    ):
-        ext_elems = collab.findall(
-            "{http://www.omg.org/spec/BPMN/20100524/MODEL}extensionElements"
-        )
-        if ext_elems:
-            # Only process the first occurrence
-            return extract_properties_from_extension(ext_elems[0])
-    return []
-
-
-def build_id_name_map(root):
-    id_name = {}
-    for elem in root.iter():
-        id_ = elem.attrib.get("id")
-        name = elem.attrib.get("name")
-        if id_:
-            id_name[id_] = name if name else id_
-    return id_name
-
-
-def extract_message_flows_with_names(root, id_name):
-    flows = []
-    for msg in root.findall(
-        ".//{http://www.omg.org/spec/BPMN/20100524/MODEL}messageFlow"
-    ):
-        source = msg.attrib.get("sourceRef")
-        target = msg.attrib.get("targetRef")
-        source_name = id_name.get(source, source)
-        target_name = id_name.get(target, target)
-        name = msg.attrib.get("name", "")
-        flows.append((source_name, target_name, name))
-    return flows
-
-
-def extract_sequence_flows_with_names(root, id_name):
-    flows = []
-    for seq in root.findall(
-        ".//{http://www.omg.org/spec/BPMN/20100524/MODEL}sequenceFlow"
-    ):
-        source = seq.attrib.get("sourceRef")
-        target = seq.attrib.get("targetRef")
-        source_name = id_name.get(source, source)
-        target_name = id_name.get(target, target)
-        name = seq.attrib.get("name", "")
-        flows.append((source_name, target_name, name))
-    return flows
-
-
-# --- CHANGE START: Components Table Extraction ---
-
-
-def extract_components(root):
-    components = []
-    for proc in root.findall(".//{http://www.omg.org/spec/BPMN/20100524/MODEL}process"):
-        proc_name = proc.attrib.get("name", "Unknown")
-        for ext_elem in proc.findall(
-            "{http://www.omg.org/spec/BPMN/20100524/MODEL}extensionElements"
-        ):
-            props = extract_properties_from_extension(ext_elem)
-            for key, value in props:
-                components.append([proc_name, key, value])
-        if not proc.findall(
-            "{http://www.omg.org/spec/BPMN/20100524/MODEL}extensionElements"
-        ):
-            components.append([proc_name, "", ""])
-    return components
-
-
-# --- CHANGE END ---
-
-
 def extract_components_from_process(proc):
     components = []
     proc_name = proc.attrib.get("name", "Unknown")
-    for ext_elem in proc.findall(
-        "{http://www.omg.org/spec/BPMN/20100524/MODEL}extensionElements"
-    ):
+    ext_elems = _XP_EXT(proc)
+    for ext_elem in ext_elems:
         props = extract_properties_from_extension(ext_elem)
         for key, value in props:
             components.append([proc_name, key, value])
-    if not proc.findall(
-        "{http://www.omg.org/spec/BPMN/20100524/MODEL}extensionElements"
-    ):
+    if not ext_elems:
         components.append([proc_name, "", ""])
     return components
 
 
 def extract_child_properties(process_elem):
     results = []
-    for child in list(process_elem):
+    for child in _XP_CHILDREN(process_elem):
         tag_name = child.tag.split("}")[-1]
         child_name = child.attrib.get("name", "")
         heading = f"{tag_name} {child_name}".strip()
         props = []
-        # Find all extensionElements inside the child
-        for ext_elem in child:
-            if ext_elem.tag.endswith("extensionElements"):
-                for prop in ext_elem:
-                    if prop.tag.endswith("property"):
-                        key = prop.findtext("key")
-                        value = prop.findtext("value")
-                        if key:
-                            props.append((format_key(key), value if value else ""))
+        # Find all extensionElements inside the child; the compiled queries only
+        # return elements, so comments/PIs kept by lxml are never visited
+        for ext_elem in _XP_EXT(child):
+            for prop in _XP_PROP(ext_elem):
+                key, value = property_key_value(prop)
+                if key:
+                    props.append((format_key(key), value if value else ""))
         results.append({"heading": heading, "properties": props})
     return results
 
 
-# --- CHANGE START: Sender Table Extraction ---
+# --- Single-pass extraction ---
+@dataclass
+class IFlowData:
+    id_name: dict = field(default_factory=dict)
+    message_flows: list = field(default_factory=list)
+    sequence_flows: list = field(default_factory=list)
+    sender_props: list = field(default_factory=list)
+    receiver_props: list = field(default_factory=list)
+    mapping_props_list: list = field(default_factory=list)  # one list per callActivity
+    exceptions: list = field(default_factory=list)  # dicts: subproc_props, children
+    processes: list = field(default_factory=list)  # dicts: id, xml, components, child_props
+    security: list = field(default_factory=list)
+    security_found: bool = False  # set by the first collaboration with extensionElements
+    collaboration_xml: list = field(default_factory=list)
+    message_flows_xml: list = field(default_factory=list)
+    metadata: dict = field(default_factory=dict)
+    appendix_info: list = field(default_factory=list)
+
+
+def _property_pairs(ext_elem):
+    return [property_key_value(prop) for prop in _XP_PROP(ext_elem)]
+
+
+def _has_property(pairs, key, value):
+    return any(
+        k and v and k.strip() == key and v.strip() == value for k, v in pairs
+    )
 
 
-def extract_sender_properties(root):
-    sender_props = []
-    ns = {
-        "bpmn2": "http://www.omg.org/spec/BPMN/20100524/MODEL",
-        "ifl": "http:///com.sap.ifl.model/Ifl.xsd",
-    }
-    for msg in root.findall(".//bpmn2:messageFlow", ns):
-        for ext_elem in msg.findall("bpmn2:extensionElements", ns):
-            # Check if any property is direction=Sender
-            is_sender = False
-            for prop in ext_elem.findall("ifl:property", ns):
-                key = prop.findtext("key")
-                value = prop.findtext("value")
-                if (
-                    key
-                    and key.strip().lower() == "direction"
-                    and value
-                    and value.strip().lower() == "sender"
-                ):
-                    is_sender = True
-                    break
-            if is_sender:
-                # Extract all properties in this extensionElements
-                for prop in ext_elem.findall("ifl:property", ns):
-                    key = prop.findtext("key")
-                    value = prop.findtext("value")
-                    if key:
-                        sender_props.append([format_key(key), value if value else ""])
-    return sender_props
-
-
-# --- CHANGE END ---
-
-
-# --- CHANGE START: Receiver Table Extraction ---
-
-
-def extract_receiver_properties(root):
-    receiver_props = []
-    ns = {
-        "bpmn2": "http://www.omg.org/spec/BPMN/20100524/MODEL",
-        "ifl": "http:///com.sap.ifl.model/Ifl.xsd",
-    }
-    for msg in root.findall(".//bpmn2:messageFlow", ns):
-        for ext_elem in msg.findall("bpmn2:extensionElements", ns):
-            # Check if any property is direction=Receiver
-            is_receiver = False
-            for prop in ext_elem.findall("ifl:property", ns):
-                key = prop.findtext("key")
-                value = prop.findtext("value")
-                if (
-                    key
-                    and key.strip().lower() == "direction"
-                    and value
-                    and value.strip().lower() == "receiver"
-                ):
-                    is_receiver = True
-                    break
-            if is_receiver:
-                # Extract all properties in this extensionElements
-                for prop in ext_elem.findall("ifl:property", ns):
-                    key = prop.findtext("key")
-                    value = prop.findtext("value")
-                    if key:
-                        receiver_props.append([format_key(key), value if value else ""])
-    return receiver_props
-
-
-# --- CHANGE END ---
-
-
-def extract_mapping_properties(root):
-    ns = {
-        "bpmn2": "http://www.omg.org/spec/BPMN/20100524/MODEL",
-        "ifl": "http:///com.sap.ifl.model/Ifl.xsd",
-    }
-    mappings = []
-    # Find all callActivity elements inside process
-    for process in root.findall(".//bpmn2:process", ns):
-        for call_activity in process.findall("bpmn2:callActivity", ns):
-            # Check for ifl:property with activityType=Mapping
-            for ext_elem in call_activity.findall("bpmn2:extensionElements", ns):
-                for prop in ext_elem.findall("ifl:property", ns):
-                    key = prop.findtext("key")
-                    value = prop.findtext("value")
-                    if (
-                        key
-                        and value
-                        and key.strip() == "activityType"
-                        and value.strip() == "Mapping"
-                    ):
-                        # If found, collect all properties for this callActivity
-                        mapping_props = []
-                        for p in ext_elem.findall("ifl:property", ns):
-                            k = p.findtext("key")
-                            v = p.findtext("value")
-                            if k:
-                                mapping_props.append([k, v if v else ""])
-                        mappings.append(mapping_props)
-    return mappings  # List of lists (one per callActivity)
-
-
-def extract_exception_properties(root):
-    ns = {
-        "bpmn2": "http://www.omg.org/spec/BPMN/20100524/MODEL",
-        "ifl": "http:///com.sap.ifl.model/Ifl.xsd",
+def _flow_refs(elem):
+    return (
+        elem.attrib.get("sourceRef"),
+        elem.attrib.get("targetRef"),
+        elem.attrib.get("name", ""),
+    )
+
+
+def _on_collaboration(elem, data):
+    data.collaboration_xml.append(ET.tostring(elem, encoding="unicode"))
+    if not data.security_found:
+        ext_elems = _XP_EXT(elem)
+        if ext_elems:
+            data.security = extract_properties_from_extension(ext_elems[0])
+            data.security_found = True
+
+
+def _on_process(elem, data):
+    data.processes.append(
+        {
+            "id": elem.attrib.get("id"),
+            "xml": ET.tostring(elem, encoding="unicode"),
+            "components": extract_components_from_process(elem),
+            "child_props": extract_child_properties(elem),
+        }
+    )
+
+
+def _on_sequence_flow(elem, data):
+    data.sequence_flows.append(_flow_refs(elem))
+
+
+def _on_message_flow(elem, data):
+    # Names are resolved after parsing, once every id has been seen
+    data.message_flows.append(_flow_refs(elem))
+    data.message_flows_xml.append(ET.tostring(elem, encoding="unicode"))
+    for ext_elem in _XP_EXT(elem):
+        pairs = _property_pairs(ext_elem)
+        direction = ""
+        for k, v in pairs:
+            if k and v and k.strip().lower() == "direction":
+                direction = v.strip().lower()
+                break
+        if direction == "sender":
+            target = data.sender_props
+        elif direction == "receiver":
+            target = data.receiver_props
+        else:
+            continue
+        target.extend([format_key(k), v if v else ""] for k, v in pairs if k)
+
+
+METADATA_KEYS = frozenset(
+    {
+        "componentversion",
+        "author",
+        "description",
+        "componentns",
+        "componentswcvname",
+        "componentswcvid",
     }
-    exceptions = []
-    # Find all subProcess elements inside process
-    for process in root.findall(".//bpmn2:process", ns):
-        for sub_proc in process.findall("bpmn2:subProcess", ns):
-            found = False
-            # Check for ifl:property with activityType=ErrorEventSubProcessTemplate
-            for ext_elem in sub_proc.findall("bpmn2:extensionElements", ns):
-                for prop in ext_elem.findall("ifl:property", ns):
-                    key = prop.findtext("key")
-                    value = prop.findtext("value")
-                    if (
-                        key
-                        and value
-                        and key.strip() == "activityType"
-                        and value.strip() == "ErrorEventSubProcessTemplate"
-                    ):
-                        found = True
-                        break
-                if found:
-                    # Collect all properties for this subProcess
-                    subproc_props = []
-                    for p in ext_elem.findall("ifl:property", ns):
-                        k = p.findtext("key")
-                        v = p.findtext("value")
-                        if k:
-                            subproc_props.append([k, v if v else ""])
-                    exceptions.append({"subproc_props": subproc_props, "children": []})
-                    # For each child of subProcess, collect its properties
-                    for child in list(sub_proc):
-                        for ext_elem_child in child.findall(
-                            "bpmn2:extensionElements", ns
-                        ):
-                            child_props = []
-                            for prop in ext_elem_child.findall("ifl:property", ns):
-                                k = prop.findtext("key")
-                                v = prop.findtext("value")
-                                if k:
-                                    child_props.append([k, v if v else ""])
-                            if child_props:
-                                exceptions[-1]["children"].append(
-                                    {
-                                        "tag": child.tag.split("}")[-1],
-                                        "name": child.attrib.get("name", ""),
-                                        "props": child_props,
-                                    }
-                                )
-                    break
-    return exceptions  # List of dicts: each with subproc_props and children
-
-
-def exception_props_to_xml(exceptions):
-    xml = "<Exceptions>\n"
-    for idx, exc in enumerate(exceptions, 1):
-        xml += f'  <ExceptionSubProcess id="{idx}">\n'
-        xml += "    <Properties>\n"
-        for key, value in exc["subproc_props"]:
-            xml += f"      <Property>\n        <Key>{key}</Key>\n        <Value>{value}</Value>\n      </Property>\n"
-        xml += "    </Properties>\n"
-        for child in exc["children"]:
-            xml += f'    <ChildElement type="{child["tag"]}" name="{child["name"]}">\n'
-            for key, value in child["props"]:
-                xml += f"      <Property>\n        <Key>{key}</Key>\n        <Value>{value}</Value>\n      </Property>\n"
-            xml += "    </ChildElement>\n"
-        xml += "  </ExceptionSubProcess>\n"
-    xml += "</Exceptions>"
-    return xml
+)
+
+
+# Metadata and appendix entries are picked out of the same walk as everything
+# else instead of rescanning every property afterwards
+def _on_property(elem, data):
+    key, value = property_key_value(elem)
+    if not (key and value):
+        return
+    lowered = key.lower()
+    if lowered in METADATA_KEYS:
+        data.metadata[key] = value
+    elif lowered.startswith("mapping"):
+        data.appendix_info.append((key, value))
+
+
+def _on_call_activity(elem, data):
+    if elem.getparent().tag != TAG_PROCESS:
+        return
+    for ext_elem in _XP_EXT(elem):
+        pairs = _property_pairs(ext_elem)
+        if _has_property(pairs, "activityType", "Mapping"):
+            data.mapping_props_list.append([[k, v if v else ""] for k, v in pairs if k])
+
+
+def _on_sub_process(elem, data):
+    if elem.getparent().tag != TAG_PROCESS:
+        return
+    for ext_elem in _XP_EXT(elem):
+        pairs = _property_pairs(ext_elem)
+        if not _has_property(pairs, "activityType", "ErrorEventSubProcessTemplate"):
+            continue
+        children = []
+        # For each child of subProcess, collect its properties
+        for child in _XP_CHILDREN(elem):
+            for ext_elem_child in _XP_EXT(child):
+                child_props = [
+                    [k, v if v else ""] for k, v in _property_pairs(ext_elem_child) if k
+                ]
+                if child_props:
+                    children.append(
+                        {
+                            "tag": child.tag.split("}")[-1],
+                            "name": child.attrib.get("name", ""),
+                            "props": child_props,
+                        }
+                    )
+        data.exceptions.append(
+            {
+                "subproc_props": [[k, v if v else ""] for k, v in pairs if k],
+                "children": children,
+            }
+        )
+        break
+
+
+_HANDLERS = {
+    TAG_COLLABORATION: _on_collaboration,
+    TAG_PROCESS: _on_process,
+    TAG_MSGFLOW: _on_message_flow,
+    TAG_SEQFLOW: _on_sequence_flow,
+    TAG_CALL_ACTIVITY: _on_call_activity,
+    TAG_SUBPROCESS: _on_sub_process,
+    TAG_IFL_PROPERTY: _on_property,
+}
+
+
+def walk_once(subtree, data):
+    id_name = data.id_name
+    for elem in subtree.iter(ET.Element):
+        id_ = elem.attrib.get("id")
+        if id_:
+            id_name[id_] = elem.attrib.get("name") or id_
+        handler = _HANDLERS.get(elem.tag)
+        if handler is not None:
+            handler(elem, data)
+
+
+# Stream the iFlow: each top-level collaboration/process is walked once when its
+# end tag is reached and then freed, so only one subtree is alive at a time.
+# The diagram-interchange section carries no data we use and is just discarded.
+def parse_iflow(source):
+    data = IFlowData()
+    for _, elem in ET.iterparse(
+        source,
+        events=("end",),
+        tag=(TAG_COLLABORATION, TAG_PROCESS, TAG_BPMN_DIAGRAM),
+    ):
+        if elem.tag != TAG_BPMN_DIAGRAM:
+            walk_once(elem, data)
+        elem.clear()
+        while elem.getprevious() is not None:
+            del elem.getparent()[0]
+    id_name = data.id_name
+    data.message_flows = [
+        (id_name.get(src, src), id_name.get(tgt, tgt), name)
+        for src, tgt, name in data.message_flows
+    ]
+    data.sequence_flows = [
+        (id_name.get(src, src), id_name.get(tgt, tgt), name)
+        for src, tgt, name in data.sequence_flows
+    ]
+    return data
 
 
 # --- Gemini-powered Section Summarizer ---
-def gemini_section_summary(section_name, xml_fragment, extra_context=""):
+def gemini_section_summary(section_name, context_text, extra_context=""):
+    if not GEMINI_ENABLED:
+        return ""
     prompt = (
-        f"Summarize the following XML for the {section_name} section of an SAP iFlow in a human-friendly, technical style. "
-        f"{extra_context}\nXML:\n{xml_fragment}\n"
+        f"Summarize the following content for the {section_name} section of an SAP iFlow in a human-friendly, technical style. "
+        f"{extra_context}\nContent:\n{context_text}\n"
         "Limit to 5 sentences."
     )
     return call_gemini(prompt)
 
 
+# Each entry is a (section_name, context_text, extra_context) tuple. The calls are
+# independent HTTPS round-trips, so they run in a thread pool and the summaries
+# come back in the same order as the input.
+def gemini_section_summaries(sections, max_workers=8):
+    if not sections:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(sections))) as executor:
+        return list(executor.map(lambda s: gemini_section_summary(*s), sections))
+
+
+def _parse_json_reply(text):
+    text = text.strip()
+    if text.startswith("```"):
+        # Drop the ```json fence line and the closing fence
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        text = text.rsplit("```", 1)[0]
+    try:
+        result = json.loads(text)
+    except ValueError:
+        return {}
+    return result if isinstance(result, dict) else {}
+
+
+# Summarize several sections with a single Gemini request. `sections` maps a
+# unique key to a (section_name, context_text, extra_context) tuple. In the prompt
+# the sections are labelled section_1..section_N, so arbitrary keys (e.g. script
+# file names) never have to round-trip through the model's JSON. Sections missing
+# from the reply (or an unparseable reply) fall back to concurrent per-section
+# calls, which are also used for everything when gemini_batch_sections is false.
+def gemini_multi_section_summary(sections):
+    if not sections:
+        return {}
+    if not GEMINI_ENABLED:
+        return {key: "" for key in sections}
+    if not GEMINI_BATCH_SECTIONS:
+        return dict(zip(sections, gemini_section_summaries(list(sections.values()))))
+    labels = {f"section_{n}": key for n, key in enumerate(sections, 1)}
+    # Sections often share a fragment (e.g. the whole collaboration), so each
+    # distinct fragment is sent once and referenced by number
+    fragment_ids = {}
+    for _, context_text, _ in sections.values():
+        fragment_ids.setdefault(context_text, len(fragment_ids) + 1)
+    prompt = (
+        "You will receive content (XML or key: value properties) for sections of an SAP iFlow. "
+        f"Summarize the following {len(labels)} sections independently, each in <=5 "
+        "sentences in a human-friendly, technical style. Return a JSON object with "
+        f"keys section_1..section_{len(labels)}, as given after '###'.\nFragments:\n"
+        + "\n---\n".join(
+            f"[Content {n}]\n{context_text}" for context_text, n in fragment_ids.items()
+        )
+        + "\nSections:\n"
+        + "\n---\n".join(
+            f"### {label}\n{section_name}. {extra_context}\nContent: [Content {fragment_ids[context_text]}]"
+            for label, (section_name, context_text, extra_context) in zip(
+                labels, sections.values()
+            )
+        )
+    )
+    reply = _parse_json_reply(call_gemini(prompt))
+    summaries = {key: str(reply[label]) for label, key in labels.items() if reply.get(label)}
+    missing = [key for key in sections if key not in summaries]
+    if missing:
+        fallback = gemini_section_summaries([sections[key] for key in missing])
+        summaries.update(zip(missing, fallback))
+    return summaries
+
+
 # --- BPMN Diagram Generation ---
-def create_bpmn_diagram_horizontal(root, image_path):
-    id_name = build_id_name_map(root)
-    flows = []
-    for seq in root.findall(
-        ".//{http://www.omg.org/spec/BPMN/20100524/MODEL}sequenceFlow"
-    ):
-        src = seq.attrib.get("sourceRef")
-        tgt = seq.attrib.get("targetRef")
-        label = seq.attrib.get("name", "")
-        flows.append((id_name.get(src, src), id_name.get(tgt, tgt), label))
-    nodes = set()
-    for src, tgt, _ in flows:
-        nodes.add(src)
-        nodes.add(tgt)
-    G = nx.DiGraph()
-    for node in nodes:
-        G.add_node(node, shape="box")
-    for src, tgt, label in flows:
-        G.add_edge(src, tgt, label=label if label else "Sequence")
-    pos = nx.nx_agraph.graphviz_layout(G, prog="dot", args="-Grankdir=LR")
-
-    plt.figure(figsize=(12, 4))
-    nx.draw(
-        G,
-        pos,
-        with_labels=True,
-        node_color="lightblue",
-        node_size=2000,
-        font_size=10,
-        arrows=True,
+def _dot_quote(text):
+    return '"' + str(text).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+# `flows` are (source name, target name, label) sequence flows
+def create_bpmn_diagram_horizontal(flows, image_path):
+    # "strict" collapses repeated source/target pairs into one edge, as DiGraph did.
+    # Nodes are implied by the edges, so the flows are streamed out in one pass.
+    edges = "".join(
+        f"  {_dot_quote(src)} -> {_dot_quote(tgt)} "
+        f"[label={_dot_quote(label if label else 'Sequence')}];\n"
+        for src, tgt, label in flows
+    )
+    dot_source = (
+        "strict digraph G {\n"
+        "  rankdir=LR;\n"
+        '  label="BPMN Diagram (Business Names, Left-to-Right)";\n'
+        "  labelloc=t;\n"
+        "  node [shape=box, style=filled, fillcolor=lightblue, fontsize=10];\n"
+        "  edge [fontcolor=red, fontsize=10];\n"
+        f"{edges}}}"
+    )
+    # Graphviz lays out and rasterizes in one step
+    subprocess.run(
+        ["dot", "-Tpng", "-o", image_path],
+        input=dot_source.encode("utf-8"),
+        check=True,
     )
-    edge_labels = nx.get_edge_attributes(G, "label")
-    nx.draw_networkx_edge_labels(G, pos, edge_labels=edge_labels, font_color="red")
-    plt.title("BPMN Diagram (Business Names, Left-to-Right)")
-    plt.tight_layout()
-    plt.savefig(image_path)
-    plt.close()
 
 
 # -------Read all Groovy scripts from the folder -------------
 
 
-def get_all_groovy_scripts(folder_path):
-    scripts = []
-    if folder_path and os.path.isdir(folder_path):
-        for fname in sorted(os.listdir(folder_path)):
-            if fname.lower().endswith(".groovy"):
-                fpath = os.path.join(folder_path, fname)
-                with open(fpath, "r", encoding="utf-8") as f:
-                    scripts.append((fname, f.read()))
-    return scripts
+def _read_groovy_script(fpath):
+    with open(fpath, "r", encoding="utf-8") as f:
+        return os.path.basename(fpath), f.read()
+
+
+def get_all_groovy_scripts(folder_path, max_workers=8):
+    if not (folder_path and os.path.isdir(folder_path)):
+        return []
+    paths = [
+        os.path.join(folder_path, fname)
+        for fname in sorted(os.listdir(folder_path))
+        if fname.lower().endswith(".groovy")
+    ]
+    if not paths:
+        return []
+    # Blocking reads overlap in the pool (helps on network drives); map keeps order
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(paths))) as executor:
+        return list(executor.map(_read_groovy_script, paths))
+
+
+# --- Section Context Helpers ---
+# Extracted properties go to Gemini as plain "key: value" lines rather than
+# being re-serialized into XML, which costs tokens without adding information.
+def props_to_text(props):
+    return "\n".join(f"{key}: {value}" for key, value in props)
+
+
+def mapping_props_to_text(mapping_props_list):
+    return "\n\n".join(
+        f"Mapping activity {idx}:\n{props_to_text(mapping_props)}"
+        for idx, mapping_props in enumerate(mapping_props_list, 1)
+    )
+
+
+def exception_props_to_text(exceptions):
+    blocks = []
+    for idx, exc in enumerate(exceptions, 1):
+        lines = [f"Exception subprocess {idx}:", props_to_text(exc["subproc_props"])]
+        for child in exc["children"]:
+            lines.append(f"{child['tag']} {child['name']}:")
+            lines.append(props_to_text(child["props"]))
+        blocks.append("\n".join(lines))
+    return "\n\n".join(blocks)
+
+
+def find_process(processes, main=True):
+    # main=True returns Process_1, otherwise the first local integration process
+    for process in processes:
+        if (process["id"] == "Process_1") == main:
+            return process
+    return None
 
 
 # --- Main Document Generation ---
@@ -466,35 +693,151 @@ def generate_iflow_spec():
     # Check if XML_PATH is a URL (GitHub raw file)
     if XML_PATH.startswith("http://") or XML_PATH.startswith("https://"):
         print(f"Downloading iFlow XML from: {XML_PATH}")
+        local_file = os.path.basename(XML_PATH)
         try:
-            response = requests.get(XML_PATH, verify=False)  # skip SSL verification
-            response.raise_for_status()
+            # Stream straight to disk so the body is never held in memory
+            with _SESSION.get(
+                XML_PATH, stream=True, verify=False, timeout=30  # skip SSL verification
+            ) as response:
+                response.raise_for_status()
+                with open(local_file, "wb") as f:
+                    for chunk in response.iter_content(chunk_size=64 * 1024):
+                        f.write(chunk)
         except requests.exceptions.RequestException as e:
             print("Error downloading the iFlow XML:", e)
             return
-
-        # Save the downloaded file locally
-        local_file = os.path.basename(XML_PATH)
-        with open(local_file, "wb") as f:
-            f.write(response.content)
         print(f"Downloaded file saved locally as: {local_file}")
-
-        # Parse the downloaded XML file
-        tree = ET.parse(local_file)
-        root = tree.getroot()
+        source = local_file
     else:
         # Local file
-        tree = ET.parse(XML_PATH)
-        root = tree.getroot()
+        source = XML_PATH
+
+    # --- Extract section data ---
+    iflow = parse_iflow(source)
+
+    # The diagram only depends on the sequence flows, so render it in the
+    # background while the Gemini requests are in flight
+    diagram_path = "bpmn_diagram.png"
+    diagram_executor = ThreadPoolExecutor(max_workers=1)
+    diagram_future = diagram_executor.submit(
+        create_bpmn_diagram_horizontal, iflow.sequence_flows, diagram_path
+    )
+    diagram_executor.shutdown(wait=False)
+
+    message_flows = iflow.message_flows
+    main_process = find_process(iflow.processes, main=True)
+    local_process = find_process(iflow.processes, main=False)
+    sender_props = iflow.sender_props
+    receiver_props = iflow.receiver_props
+    mapping_props_list = iflow.mapping_props_list
+    security = iflow.security
+    groovy_scripts = get_all_groovy_scripts(GROOVY_SCRIPTS_FOLDER)
+    exceptions = iflow.exceptions
+    metadata = iflow.metadata
+    appendix_info = iflow.appendix_info
+    # Shared by several sections below
+    collaboration_xml = "\n".join(iflow.collaboration_xml)
+    processes_xml = "\n".join(process["xml"] for process in iflow.processes)
+
+    # --- Gemini summaries: one batched request per group of sections ---
+    sections = {
+        "overview": (
+            "Overview",
+            collaboration_xml,
+            f"Describe the purpose of this technical specification document for the iFlow named {iflow_name}. Don't explain the iflow but just provide what is the use of this technical specification document .",
+        ),
+        "design": (
+            "High level iFlow Design",
+            processes_xml,
+            f"Describe the main components and flow of the message in the iFlow named {iflow_name} from Sender system to Receiver system.",
+        ),
+        "message_flows": (
+            "Message Flow",
+            "\n".join(iflow.message_flows_xml),
+            "",
+        ),
+        "process_1": (
+            "Main Integration Process",
+            main_process["xml"] if main_process else "",
+            "Summarize the main integration process and its child elements for SAP iFlow Process_1.",
+        ),
+        "local_process": (
+            "Main Integration Process",
+            local_process["xml"] if local_process else "",
+            "Summarize the main integration process and its child elements for SAP iFlow Process_1.",
+        ),
+        "sender": (
+            "Sender",
+            props_to_text(sender_props),
+            "Identify the sender system, protocol, authentication method, and key configuration parameters. "
+            "Explain the business role of this endpoint. ",
+        ),
+        "receiver": (
+            "Receiver",
+            props_to_text(receiver_props),
+            "Identify receiver components and describe their role.",
+        ),
+        "mappings": (
+            "Mappings",
+            mapping_props_to_text(mapping_props_list),
+            "Describe any data mapping or transformation logic.",
+        ),
+        "security": (
+            "Security",
+            collaboration_xml,
+            "",
+        ),
+        "groovy": (
+            "Groovy Scripts",
+            processes_xml,
+            f"Describe how and where groovy script is used in the iflow, {iflow_name}.",
+        ),
+        "error_handling": (
+            "Error Handling & Logging",
+            exception_props_to_text(exceptions),
+            "Describe error handling and logging mechanisms.",
+        ),
+        "metadata": (
+            "Version and Metadata",
+            props_to_text(metadata.items()),
+            "Summarize the key metadata and versioning information for this SAP iFlow.",
+        ),
+        "appendix": (
+            "Appendix",
+            props_to_text(appendix_info),
+            "List and briefly describe all technical artifacts, mappings, and scripts referenced in this iFlow.",
+        ),
+    }
+    # Nothing to summarize; the document already says these sections are empty
+    if not metadata:
+        del sections["metadata"]
+    if not appendix_info:
+        del sections["appendix"]
+    script_sections = {
+        fname: (
+            f"Groovy Script: {fname}",
+            content,
+            "Explain in detail what this Groovy script does in the context of SAP Integration Suite iFlow. Focus on its logic, purpose, and any important variables or functions.",
+        )
+        for fname, content in groovy_scripts
+    }
+    # The script explanations don't depend on the section summaries, so both
+    # batches are in flight at the same time
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        summaries_future = executor.submit(gemini_multi_section_summary, sections)
+        scripts_future = executor.submit(gemini_multi_section_summary, script_sections)
+        summaries = summaries_future.result()
+        script_explanations = scripts_future.result()
 
     doc = Document()
     add_header_footer(
         doc, f"{iflow_name}Technical Specification", "Generated by AI", "1.0"
     )
+    body = []
 
     # Title Page
     add_paragraph(
-        doc,
+        body,
         "SAP Integration Suite \n"
         "Cloud Integration - Technical Specification\n "
         f"iFlow Name : {iflow_name}",
@@ -502,14 +845,14 @@ def generate_iflow_spec():
         center=True,
         font_size=24,
     )
-    # add_paragraph(doc, f"iFlow Source: {XML_PATH}")
-    add_paragraph(doc, "Version: 1.0", center=True)
-    add_paragraph(doc, "Author: Generated by AI", center=True)
-    add_paragraph(doc, f"Date: {datetime.today().strftime('%Y-%m-%d')}", center=True)
-    doc.add_page_break()
+    # add_paragraph(body, f"iFlow Source: {XML_PATH}")
+    add_paragraph(body, "Version: 1.0", center=True)
+    add_paragraph(body, "Author: Generated by AI", center=True)
+    add_paragraph(body, f"Date: {datetime.today().strftime('%Y-%m-%d')}", center=True)
+    add_page_break(body)
 
     # Table of Contents
-    add_heading(doc, "Table of Contents", level=1)
+    add_heading(body, "Table of Contents", level=1)
     toc_sections = [
         "1. Change History",
         "2. Overview",
@@ -528,13 +871,13 @@ def generate_iflow_spec():
         "7. Appendix",
     ]
     for section in toc_sections:
-        add_paragraph(doc, section)
-    doc.add_page_break()
+        add_paragraph(body, section)
+    add_page_break(body)
 
     # 1. Change History
-    add_heading(doc, "1. Change History", level=1)
+    add_heading(body, "1. Change History", level=1)
     add_colored_table(
-        doc,
+        body,
         [
             [
                 "1.0",
@@ -545,424 +888,194 @@ def generate_iflow_spec():
         ],
         ["Version", "Date", "Author", "Description"],
     )
-    doc.add_page_break()
+    add_page_break(body)
 
     # 2. Overview
-    add_heading(doc, "2. Overview", level=1)
-    overview_xml = extract_section_xml(
-        root, ".//{http://www.omg.org/spec/BPMN/20100524/MODEL}collaboration"
-    )
-    overview_text = gemini_section_summary(
-        "Overview",
-        overview_xml,
-        f"Describe the purpose of this technical specification document for the iFlow named {iflow_name}. Don't explain the iflow but just provide what is the use of this technical specification document .",
-    )
-    add_paragraph(doc, overview_text)
-    # doc.add_page_break()
+    add_heading(body, "2. Overview", level=1)
+    add_paragraph(body, summaries["overview"])
+    # add_page_break(body)
 
     # 3. High level iFlow Design
-    add_heading(doc, "3. High level iFlow Design", level=1)
-    design_xml = extract_section_xml(
-        root, ".//{http://www.omg.org/spec/BPMN/20100524/MODEL}process"
-    )
-    design_text = gemini_section_summary(
-        "High level iFlow Design",
-        design_xml,
-        f"Describe the main components and flow of the message in the iFlow named {iflow_name} from Sender system to Receiver system.",
-    )
-    add_paragraph(doc, design_text)
-    diagram_path = "bpmn_diagram.png"
-    create_bpmn_diagram_horizontal(root, diagram_path)
-    doc.add_picture(diagram_path, width=Inches(6))
-    add_paragraph(
-        doc, "Figure: High level BPMN iFlow message and sequence flow", center=True
-    )
-    # doc.add_page_break()
+    add_heading(body, "3. High level iFlow Design", level=1)
+    add_paragraph(body, summaries["design"])
+    # Graphviz is an external binary; without it the document is still produced
+    try:
+        diagram_future.result()
+    except (OSError, subprocess.CalledProcessError) as e:
+        print("Skipping BPMN diagram, Graphviz rendering failed:", e)
+    else:
+        add_picture(body, doc, diagram_path, Inches(6))
+        add_paragraph(
+            body, "Figure: High level BPMN iFlow message and sequence flow", center=True
+        )
+    # add_page_break(body)
 
     # 4. Message Flow
-    add_heading(doc, "4. Message Flow", level=1)
-    id_name = build_id_name_map(root)
-    message_flows = extract_message_flows_with_names(root, id_name)
-    message_flows_xml = extract_section_xml(
-        root, ".//{http://www.omg.org/spec/BPMN/20100524/MODEL}messageFlow"
-    )
-    message_flows_text = gemini_section_summary("Message Flow", message_flows_xml)
-    add_paragraph(doc, message_flows_text)
+    add_heading(body, "4. Message Flow", level=1)
+    add_paragraph(body, summaries["message_flows"])
     # --- CHANGE START: Add message flows table ---
     if message_flows:
         add_colored_table(
-            doc,
+            body,
             [[src, tgt, label] for src, tgt, label in message_flows],
             ["Source", "Target", "Name"],
         )
     # --- CHANGE END ---
-    # doc.add_page_break()
+    # add_page_break(body)
 
     # 5. Technical Description
-    add_heading(doc, "5. Technical Description", level=1)
+    add_heading(body, "5. Technical Description", level=1)
 
     # 5.1. Main Integration Process
-    add_heading(doc, "5.1. Main Integration Process ", level=2)
-
-    def extract_process_1_xml(root):
-        ns = {"bpmn2": "http://www.omg.org/spec/BPMN/20100524/MODEL"}
-        for process in root.findall(".//bpmn2:process", ns):
-            if process.attrib.get("id") == "Process_1":
-                return ET.tostring(process, encoding="unicode")
-        return ""
-
-    process_1_xml = extract_process_1_xml(root)
-    process_1_text = gemini_section_summary(
-        "Main Integration Process",
-        process_1_xml,
-        "Summarize the main integration process and its child elements for SAP iFlow Process_1.",
-    )
-    add_paragraph(doc, process_1_text)
+    add_heading(body, "5.1. Main Integration Process ", level=2)
+    add_paragraph(body, summaries["process_1"])
 
     # --- CHANGE START: Add components table ---
-
-    # Find the process with id="Process_1"
-    target_process = None
-    for process in root.findall(
-        ".//{http://www.omg.org/spec/BPMN/20100524/MODEL}process"
-    ):
-        if process.attrib.get("id") == "Process_1":
-            target_process = process
-            break
-
     components = []
-    if target_process is not None:
-        components = extract_components_from_process(target_process)
+    if main_process is not None:
+        components = main_process["components"]
     if components:
         add_colored_table(
-            doc,
+            body,
             components,
             ["Component Name", "Key", "Value"],
         )
-
     # --- CHANGE END ---
 
-    ns = {
-        "bpmn2": "http://www.omg.org/spec/BPMN/20100524/MODEL",
-        "ifl": "http:///com.sap.ifl.model/Ifl.xsd",
-    }
-
-    target_process = None
-    for process in root.findall(
-        ".//{http://www.omg.org/spec/BPMN/20100524/MODEL}process"
-    ):
-        if process.attrib.get("id") == "Process_1":
-            target_process = process
-            break
-
-    if target_process is not None:
-        child_props = extract_child_properties(target_process)
+    if main_process is not None:
+        child_props = main_process["child_props"]
         for item in child_props:
-            # add_heading(doc, f"{item['heading']} Properties", level=3)
+            # add_heading(body, f"{item['heading']} Properties", level=3)
             if item["properties"]:
-                add_heading(doc, f"{item['heading']} Properties", level=3)
-                add_colored_table(doc, item["properties"], ["Key", "Value"])
+                add_heading(body, f"{item['heading']} Properties", level=3)
+                add_colored_table(body, item["properties"], ["Key", "Value"])
         # else:
-        #     add_paragraph(doc, "No properties found for this element.")
+        #     add_paragraph(body, "No properties found for this element.")
     else:
-        add_paragraph(doc, "No process with id='Process_1' found.")
+        add_paragraph(body, "No process with id='Process_1' found.")
 
     # 5.2. Local Integration Process
-    add_heading(doc, "5.2. Local Integration Process ", level=2)
-
-    def extract_process_local_xml(root):
-        ns = {"bpmn2": "http://www.omg.org/spec/BPMN/20100524/MODEL"}
-        for process in root.findall(".//bpmn2:process", ns):
-            if process.attrib.get("id") != "Process_1":
-                return ET.tostring(process, encoding="unicode")
-        return ""
-
-    local_process_xml = extract_process_local_xml(root)
-    local_process_text = gemini_section_summary(
-        "Main Integration Process",
-        local_process_xml,
-        "Summarize the main integration process and its child elements for SAP iFlow Process_1.",
-    )
-    add_paragraph(doc, local_process_text)
+    add_heading(body, "5.2. Local Integration Process ", level=2)
+    add_paragraph(body, summaries["local_process"])
     # --- CHANGE START: Add components table ---
-    # Find the process with id="Process_1"
-    target_process = None
-    for process in root.findall(
-        ".//{http://www.omg.org/spec/BPMN/20100524/MODEL}process"
-    ):
-        if process.attrib.get("id") != "Process_1":
-            target_process = process
-            break
-
     components = []
-    if target_process is not None:
-        components = extract_components_from_process(target_process)
+    if local_process is not None:
+        components = local_process["components"]
     if components:
         add_colored_table(
-            doc,
+            body,
             components,
             ["Component Name", "Key", "Value"],
         )
     # --- CHANGE END ---
-    ns = {
-        "bpmn2": "http://www.omg.org/spec/BPMN/20100524/MODEL",
-        "ifl": "http:///com.sap.ifl.model/Ifl.xsd",
-    }
-
-    local_process = None
-    for process in root.findall(
-        ".//{http://www.omg.org/spec/BPMN/20100524/MODEL}process"
-    ):
-        if process.attrib.get("id") != "Process_1":
-            local_process = process
-            break
 
     if local_process is not None:
-        child_props = extract_child_properties(local_process)
+        child_props = local_process["child_props"]
         for item in child_props:
-            # add_heading(doc, f"{item['heading']} Properties", level=3)
+            # add_heading(body, f"{item['heading']} Properties", level=3)
             if item["properties"]:
-                add_heading(doc, f"{item['heading']} Properties", level=3)
-                add_colored_table(doc, item["properties"], ["Key", "Value"])
+                add_heading(body, f"{item['heading']} Properties", level=3)
+                add_colored_table(body, item["properties"], ["Key", "Value"])
             # else:
-            #    add_paragraph(doc, "No properties found for this element.")
+            #    add_paragraph(body, "No properties found for this element.")
     else:
-        add_paragraph(doc, "No process with id='Process_1' found.")
+        add_paragraph(body, "No process with id='Process_1' found.")
 
     # 5.3. Sender
-    add_heading(doc, "5.3. Sender", level=2)
-
-    def sender_props_to_xml(sender_props):
-        xml = "<SenderProperties>\n"
-        for key, value in sender_props:
-            xml += f"  <Property>\n    <Key>{key}</Key>\n    <Value>{value}</Value>\n  </Property>\n"
-        xml += "</SenderProperties>"
-        return xml
-
-    sender_props = extract_sender_properties(root)
-    sender_props_xml = sender_props_to_xml(sender_props)
-
-    sender_text = gemini_section_summary(
-        "Sender",
-        sender_props_xml,
-        "Identify the sender system, protocol, authentication method, and key configuration parameters. "
-        "Explain the business role of this endpoint. ",
-    )
-    add_paragraph(doc, sender_text)
+    add_heading(body, "5.3. Sender", level=2)
+    add_paragraph(body, summaries["sender"])
     # --- CHANGE START: Add sender table ---
-    sender_props = extract_sender_properties(root)
     if sender_props:
         add_colored_table(
-            doc,
+            body,
             sender_props,
             ["Key", "Value"],
         )
     # --- CHANGE END ---
 
     # 5.4. Receiver
-    add_heading(doc, "5.4. Receiver", level=2)
-
-    def receiver_props_to_xml(receiver_props):
-        xml = "<ReceiverProperties>\n"
-        for key, value in receiver_props:
-            xml += f"  <Property>\n    <Key>{key}</Key>\n    <Value>{value}</Value>\n  </Property>\n"
-        xml += "</ReceiverProperties>"
-        return xml
-
-    receiver_props = extract_receiver_properties(root)
-    receiver_props_xml = receiver_props_to_xml(receiver_props)
-
-    receiver_text = gemini_section_summary(
-        "Receiver",
-        receiver_props_xml,
-        "Identify receiver components and describe their role.",
-    )
-    add_paragraph(doc, receiver_text)
+    add_heading(body, "5.4. Receiver", level=2)
+    add_paragraph(body, summaries["receiver"])
     # --- CHANGE START: Add receiver table ---
-    receiver_props = extract_receiver_properties(root)
     if receiver_props:
         add_colored_table(
-            doc,
+            body,
             receiver_props,
             ["Key", "Value"],
         )
     # --- CHANGE END ---
 
     # 5.5. Mapping
-    add_heading(doc, "5.5. Mappings", level=2)
-
-    def mapping_props_to_xml(mapping_props_list):
-        xml = "<Mappings>\n"
-        for idx, mapping_props in enumerate(mapping_props_list, 1):
-            xml += f'  <MappingActivity id="{idx}">\n'
-            for key, value in mapping_props:
-                xml += f"    <Property>\n      <Key>{key}</Key>\n      <Value>{value}</Value>\n    </Property>\n"
-            xml += "  </MappingActivity>\n"
-        xml += "</Mappings>"
-        return xml
-
-    mapping_props_list = extract_mapping_properties(root)
-    mapping_props_xml = mapping_props_to_xml(mapping_props_list)
-    mapping_text = gemini_section_summary(
-        "Mappings",
-        mapping_props_xml,
-        "Describe any data mapping or transformation logic.",
-    )
-    add_paragraph(doc, mapping_text)
+    add_heading(body, "5.5. Mappings", level=2)
+    add_paragraph(body, summaries["mappings"])
 
     # Extract mapping properties and add tables
-
-    mapping_props_list = extract_mapping_properties(root)
     if mapping_props_list:
         for idx, mapping_props in enumerate(mapping_props_list, 1):
-            add_heading(doc, f"Mapping Activity {idx} Properties", level=3)
-            add_colored_table(doc, mapping_props, ["Key", "Value"])
+            add_heading(body, f"Mapping Activity {idx} Properties", level=3)
+            add_colored_table(body, mapping_props, ["Key", "Value"])
     else:
-        add_paragraph(doc, "No mapping activities found in the iFlow.")
+        add_paragraph(body, "No mapping activities found in the iFlow.")
 
     # 5.6. Security
-    add_heading(doc, "5.6. Security", level=2)
-    security = extract_security(root)
-    security_xml = extract_section_xml(
-        root, ".//{http://www.omg.org/spec/BPMN/20100524/MODEL}collaboration"
-    )
-    security_text = gemini_section_summary("Security", security_xml)
-    add_paragraph(doc, security_text)
+    add_heading(body, "5.6. Security", level=2)
+    add_paragraph(body, summaries["security"])
     if security:
-        add_colored_table(doc, security, ["Key", "Value"])
+        add_colored_table(body, security, ["Key", "Value"])
     else:
-        add_paragraph(doc, "No security properties found.")
+        add_paragraph(body, "No security properties found.")
 
     # 5.7. Groovy Scripts
-    add_heading(doc, "5.7. Groovy Scripts", level=2)
-    components_xml = extract_section_xml(
-        root, ".//{http://www.omg.org/spec/BPMN/20100524/MODEL}process"
-    )
-    message_handling_text = gemini_section_summary(
-        "Groovy Scripts",
-        components_xml,
-        f"Describe how and where groovy script is used in the iflow, {iflow_name}.",
-    )
-    add_paragraph(doc, message_handling_text)
+    add_heading(body, "5.7. Groovy Scripts", level=2)
+    add_paragraph(body, summaries["groovy"])
 
-    groovy_scripts = get_all_groovy_scripts(GROOVY_SCRIPTS_FOLDER)
     if groovy_scripts:
         for fname, content in groovy_scripts:
-            add_heading(doc, f"Script: {fname}", level=3)
+            add_heading(body, f"Script: {fname}", level=3)
+            add_paragraph(body, script_explanations[fname])
 
-            # Send script to Gemini for explanation
-            explanation = gemini_section_summary(
-                f"Groovy Script: {fname}",
-                content,
-                "Explain in detail what this Groovy script does in the context of SAP Integration Suite iFlow. Focus on its logic, purpose, and any important variables or functions.",
-            )
-            add_paragraph(doc, explanation)
-
-            p = doc.add_paragraph()
-            run = p.add_run(content)
-            font = run.font
-            font.name = "Courier New"
-            font.size = Pt(10)
+            body.append(_p_xml(content, font_name="Courier New", font_size=10))
     else:
-        add_paragraph(doc, "No Groovy scripts found in the specified folder.")
+        add_paragraph(body, "No Groovy scripts found in the specified folder.")
 
     # 5.8. Error Handling & Logging
-    add_heading(doc, "5.8. Error Handling & Logging", level=2)
-
-    exceptions = extract_exception_properties(root)
-    exceptions_xml = exception_props_to_xml(exceptions)
-
-    error_handling_text = gemini_section_summary(
-        "Error Handling & Logging",
-        exceptions_xml,
-        "Describe error handling and logging mechanisms.",
-    )
-    add_paragraph(doc, error_handling_text)
+    add_heading(body, "5.8. Error Handling & Logging", level=2)
+    add_paragraph(body, summaries["error_handling"])
 
     if exceptions:
         for idx, exc in enumerate(exceptions, 1):
-            add_heading(doc, f"Exception SubProcess {idx} Properties", level=3)
-            add_colored_table(doc, exc["subproc_props"], ["Key", "Value"])
+            add_heading(body, f"Exception SubProcess {idx} Properties", level=3)
+            add_colored_table(body, exc["subproc_props"], ["Key", "Value"])
             for child in exc["children"]:
                 add_heading(
-                    doc, f'Child Element: {child["tag"]} {child["name"]}', level=4
+                    body, f'Child Element: {child["tag"]} {child["name"]}', level=4
                 )
-                add_colored_table(doc, child["props"], ["Key", "Value"])
+                add_colored_table(body, child["props"], ["Key", "Value"])
     else:
-        add_paragraph(doc, "No exception subprocesses found in the iFlow.")
+        add_paragraph(body, "No exception subprocesses found in the iFlow.")
 
     # 6. Version and Metadata
-    add_heading(doc, "6. Version and Metadata", level=1)
-
-    def extract_metadata_from_xml(root):
-        metadata = {}
-        # Search for common metadata keys
-        for prop in root.findall(".//{http:///com.sap.ifl.model/Ifl.xsd}property"):
-            key = prop.findtext("key")
-            value = prop.findtext("value")
-            if key and value:
-                if key.lower() in [
-                    "componentversion",
-                    "author",
-                    "description",
-                    "componentns",
-                    "componentswcvname",
-                    "componentswcvid",
-                ]:
-                    metadata[key] = value
-        return metadata
-
-    metadata = extract_metadata_from_xml(root)
+    add_heading(body, "6. Version and Metadata", level=1)
     if metadata:
-        add_colored_table(doc, [[k, v] for k, v in metadata.items()], ["Key", "Value"])
+        add_colored_table(body, [[k, v] for k, v in metadata.items()], ["Key", "Value"])
+        add_paragraph(body, summaries["metadata"])
     else:
-        add_paragraph(doc, "No metadata found in XML.")
-    metadata_xml = (
-        "<Metadata>\n"
-        + "\n".join([f"<{k}>{v}</{k}>" for k, v in metadata.items()])
-        + "\n</Metadata>"
-    )
-    metadata_summary = gemini_section_summary(
-        "Version and Metadata",
-        metadata_xml,
-        "Summarize the key metadata and versioning information for this SAP iFlow.",
-    )
-    add_paragraph(doc, metadata_summary)
+        add_paragraph(body, "No metadata found in XML.")
 
     # 7. Appendix
-    add_heading(doc, "7. Appendix", level=1)
-
-    def extract_appendix_info(root):
-        appendix = []
-        # Example: List all mapping activities
-        for prop in root.findall(".//{http:///com.sap.ifl.model/Ifl.xsd}property"):
-            key = prop.findtext("key")
-            value = prop.findtext("value")
-            if key and value and key.lower().startswith("mapping"):
-                appendix.append((key, value))
-        return appendix
-
-    appendix_xml = extract_section_xml(
-        root, ".//{http://www.omg.org/spec/BPMN/20100524/MODEL}process"
-    )
-    appendix_summary = gemini_section_summary(
-        "Appendix",
-        appendix_xml,
-        "List and briefly describe all technical artifacts, mappings, and scripts referenced in this iFlow.",
-    )
-    add_paragraph(doc, appendix_summary)
-
-    appendix_info = extract_appendix_info(root)
+    add_heading(body, "7. Appendix", level=1)
     if appendix_info:
-        add_colored_table(doc, appendix_info, ["Key", "Value"])
+        add_paragraph(body, summaries["appendix"])
+        add_colored_table(body, appendix_info, ["Key", "Value"])
     else:
-        add_paragraph(doc, "No additional appendix info found in XML.")
+        add_paragraph(body, "No additional appendix info found in XML.")
 
     os.makedirs("output_docs", exist_ok=True)
 
     timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
     DOCX_PATH = os.path.join("output_docs", f"iFlow_Documentation_{timestamp}.docx")
 
+    append_body_xml(doc, body)
     doc.save(DOCX_PATH)
     print(f"✅ Document saved as: {DOCX_PATH}")
 